@@ -0,0 +1 @@
+"""Terminal audio players with waveform and spectrum visualizers."""
@@ -0,0 +1,56 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Compiled waveform row assembly for play_peak.
+
+Build in place with ``python setup.py build_ext --inplace``. play_peak falls
+back to numba or NumPy when this extension is not built.
+"""
+from libc.string cimport memcpy
+
+
+def fill_waveform_rows(const long long[::1] levels,
+                       const unsigned char[:, ::1] sgr,
+                       const long long[::1] sgr_len,
+                       const unsigned char[::1] on_cell,
+                       const unsigned char[::1] off_cell,
+                       const unsigned char[::1] reset,
+                       unsigned char[::1] out,
+                       long long[::1] row_ends):
+    """
+    Write the waveform rows, top row first, as UTF-8 bytes into ``out``.
+
+    Same contract as play_peak._fill_waveform_rows: row k ends at
+    ``row_ends[k]`` and the total byte count is returned.
+    """
+    cdef Py_ssize_t height = sgr.shape[0]
+    cdef Py_ssize_t width = levels.shape[0]
+    cdef Py_ssize_t n_on = on_cell.shape[0]
+    cdef Py_ssize_t n_off = off_cell.shape[0]
+    cdef Py_ssize_t n_reset = reset.shape[0]
+    cdef Py_ssize_t pos = 0
+    cdef Py_ssize_t k, col
+    cdef long long row
+    cdef bint lit
+
+    with nogil:
+        for k in range(height):
+            row = height - 1 - k
+            lit = False
+            for col in range(width):
+                if levels[col] >= row:
+                    lit = True
+                    break
+            if lit:
+                memcpy(&out[pos], &sgr[row, 0], sgr_len[row])
+                pos += sgr_len[row]
+            for col in range(width):
+                if levels[col] >= row:
+                    memcpy(&out[pos], &on_cell[0], n_on)
+                    pos += n_on
+                else:
+                    memcpy(&out[pos], &off_cell[0], n_off)
+                    pos += n_off
+            memcpy(&out[pos], &reset[0], n_reset)
+            pos += n_reset
+            row_ends[k] = pos
+    return pos
@@ -4,8 +4,17 @@ import threading
 import argparse
 import sounddevice as sd
 import numpy as np
-from mutagen import File as MutagenFile
-from .utils import load_audio
+from .utils import load_audio, ansi_fg, resample_audio, to_pcm16, make_pcm_callback, read_tags, get_terminal
+
+try:
+    from ._render import fill_waveform_rows as _fill_waveform_rows_c
+except ImportError:
+    _fill_waveform_rows_c = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 # Unicode blocks (unused here, but kept for reference)
 BLOCKS = " ▁▂▃▄▅▆▇█"
@@ -14,50 +23,218 @@ BLOCKS = " ▁▂▃▄▅▆▇█"
 DEFAULT_COLORS = [160, 166, 3, 46, 22][::-1]  # Reverse for top-to-bottom rendering
 color_steps = DEFAULT_COLORS
 
-def render_waveform_vertical(chunk, width=160, height=8):
+# Pre-encoded frame pieces written straight to sys.stdout.buffer
+ROW_PREFIX = "│".encode()
+
+# Waveform redraw rate cap
+FPS = 30
+
+def _row_color_idx(row, height):
+    """Index into color_steps for a row, by its vertical position."""
+    return (
+        4 if row >= height * 0.9 else
+        3 if row >= height * 0.7 else
+        2 if row >= height * 0.5 else
+        1 if row >= 2 else
+        0
+    )
+
+
+# (height, colors) -> per-row SGR prefix, indexed by row from the bottom
+_ROW_SGR = {}
+
+
+def _row_sgr(height):
+    key = (height, tuple(color_steps))
+    prefixes = _ROW_SGR.get(key)
+    if prefixes is None:
+        prefixes = _ROW_SGR[key] = [
+            ansi_fg(color_steps[_row_color_idx(r, height)]) for r in range(height)
+        ]
+    return prefixes
+
+
+def _fill_waveform_rows(levels, sgr, sgr_len, on_cell, off_cell, reset, out, row_ends):
+    """
+    Write the waveform rows, top row first, as UTF-8 bytes into ``out``.
+
+    Row k ends at ``row_ends[k]``. Compiled with numba when it is installed and
+    the Cython version in _render.pyx has not been built.
+    """
+    height = sgr.shape[0]
+    pos = 0
+    for k in range(height):
+        row = height - 1 - k
+        lit = False
+        for level in levels:
+            if level >= row:
+                lit = True
+                break
+        if lit:
+            for b in range(sgr_len[row]):
+                out[pos] = sgr[row, b]
+                pos += 1
+        for level in levels:
+            cell = on_cell if level >= row else off_cell
+            for b in range(cell.shape[0]):
+                out[pos] = cell[b]
+                pos += 1
+        for b in range(reset.shape[0]):
+            out[pos] = reset[b]
+            pos += 1
+        row_ends[k] = pos
+    return pos
+
+
+# Prefer the Cython extension, then numba; otherwise rows are built with NumPy
+if _fill_waveform_rows_c is not None:
+    _compiled_fill_rows = _fill_waveform_rows_c
+elif njit is not None:
+    _compiled_fill_rows = njit(cache=True)(_fill_waveform_rows)
+else:
+    _compiled_fill_rows = None
+
+_CELL_ON = np.frombuffer("███".encode(), dtype=np.uint8)
+_CELL_OFF = np.frombuffer(b"   ", dtype=np.uint8)
+_RESET = np.frombuffer(b"\033[0m", dtype=np.uint8)
+# (width, height, colors) -> (sgr, sgr_len, out, row_ends), reused across frames
+_ROW_BUFFERS = {}
+
+
+def _render_rows_compiled(levels, height):
+    key = (len(levels), height, tuple(color_steps))
+    bufs = _ROW_BUFFERS.get(key)
+    if bufs is None:
+        prefixes = [p.encode() for p in _row_sgr(height)]
+        sgr = np.zeros((height, max(len(p) for p in prefixes)), dtype=np.uint8)
+        for r, p in enumerate(prefixes):
+            sgr[r, :len(p)] = np.frombuffer(p, dtype=np.uint8)
+        sgr_len = np.array([len(p) for p in prefixes], dtype=np.int64)
+        out = np.empty(height * (sgr.shape[1] + len(levels) * len(_CELL_ON) + len(_RESET)), dtype=np.uint8)
+        row_ends = np.empty(height, dtype=np.int64)
+        bufs = _ROW_BUFFERS[key] = (sgr, sgr_len, out, row_ends)
+    sgr, sgr_len, out, row_ends = bufs
+
+    _compiled_fill_rows(levels, sgr, sgr_len, _CELL_ON, _CELL_OFF, _RESET, out, row_ends)
+    rows = []
+    start = 0
+    for end in row_ends:
+        rows.append(out[start:end].tobytes())
+        start = end
+    return rows
+
+
+def _column_envelope_kernel(chunk, step, n_cols, out):
+    """Scalar min/max scan per column; compiled with numba when installed."""
+    for i in range(n_cols):
+        base = i * step
+        lo = chunk[base]
+        hi = chunk[base]
+        for j in range(base + 1, base + step):
+            v = chunk[j]
+            if v < lo:
+                lo = v
+            if v > hi:
+                hi = v
+        hi_f = np.float32(hi)
+        lo_f = -np.float32(lo)
+        out[i] = hi_f if hi_f > lo_f else lo_f
+
+
+if njit is not None:
+    _column_envelope_kernel = njit(cache=True, fastmath=True, boundscheck=False)(
+        _column_envelope_kernel
+    )
+
+
+# n_cols -> float32 output buffer for the numba envelope, reused across frames
+_ENVELOPE_BUFFERS = {}
+
+
+def column_envelope(chunk, step, width):
+    """
+    Peak amplitude of each of ``width`` columns of ``step`` samples, taken from
+    the per-column min/max envelope.
+
+    On the numba path the result is a shared buffer, overwritten by the next
+    call with the same column count.
+    """
+    if njit is not None:
+        n_cols = min(width, len(chunk) // step)
+        out = _ENVELOPE_BUFFERS.get(n_cols)
+        if out is None:
+            out = _ENVELOPE_BUFFERS[n_cols] = np.empty(n_cols, dtype=np.float32)
+        _column_envelope_kernel(chunk, step, n_cols, out)
+        return out
+
+    blocks = chunk[:step * width].reshape(-1, step)
+    # Reduce in the input dtype (int16 PCM works), widen only the results
+    hi = blocks.max(axis=1).astype(np.float32)
+    lo = blocks.min(axis=1).astype(np.float32)
+    return np.maximum(hi, -lo)
+
+
+def waveform_peak(y):
+    """
+    Largest column value render_waveform_vertical can see anywhere in ``y``;
+    pass it as ``peak`` for a fixed scale.
+    """
+    if len(y) == 0:
+        return 0.0
+    return max(float(y.max()), -float(y.min()))
+
+
+def render_waveform_vertical(chunk, width=160, height=8, peak=None):
     """
     Render an audio chunk as vertical waveform bars using ANSI colors.
+
+    Rows are returned top first as UTF-8 bytes, ready for sys.stdout.buffer.
+    ``peak`` is the column value drawn at full height; by default each chunk
+    is scaled to its own maximum.
     """
     if len(chunk) == 0:
-        return ["   " * width for _ in range(height)]
+        return [_CELL_OFF.tobytes() * width for _ in range(height)]
 
     # Downsample to terminal width
     step = max(1, len(chunk) // width)
-    sampled = np.abs(chunk[:step * width].reshape(-1, step).mean(axis=1))
-    norm = sampled / np.max(sampled) if np.max(sampled) > 0 else sampled
-    levels = (norm * (height - 1)).astype(int)
+    sampled = column_envelope(chunk, step, width)
+    if peak is None:
+        peak = sampled.max()
+    if peak > 0:
+        norm = sampled / peak
+        np.minimum(norm, 1.0, out=norm)
+    else:
+        norm = sampled
+    levels = (norm * (height - 1)).astype(np.int64)
+
+    if _compiled_fill_rows is not None:
+        return _render_rows_compiled(levels, height)
+
+    row_sgr = _row_sgr(height)
+    # Whole on/off grid in one broadcast, top row (height-1) first
+    row_ids = np.arange(height - 1, -1, -1)
+    mask = levels[None, :] >= row_ids[:, None]
+    cells = np.where(mask, '███', '   ')
+    lit = mask.any(axis=1)
 
     rows = []
-    # Build each row from top (height-1) down to 0
-    for row in reversed(range(height)):
-        line = ''
-        for level in levels:
-            # choose color index based on vertical position
-            color_idx = (
-                4 if row >= height * 0.9 else
-                3 if row >= height * 0.7 else
-                2 if row >= height * 0.5 else
-                1 if row >= 2 else
-                0
-            )
-            color = color_steps[color_idx]
-            if level >= row:
-                line += f"\033[38;5;{color}m███"
-            else:
-                line += '   '
-        line += '\033[0m'  # reset at line end
-        rows.append(line)
+    for k, row in enumerate(row_ids):
+        line = ''.join(cells[k].tolist())
+        if lit[k]:
+            # one SGR per row: spaces don't show the foreground colour
+            line = row_sgr[row] + line
+        rows.append((line + '\033[0m').encode())  # reset at line end
     return rows
 
 
 def print_metadata(filepath):
-    meta = MutagenFile(filepath, easy=True)
-    if meta is None:
+    tags = read_tags(filepath)
+    if tags is None:
         print("No metadata found.")
         return
     print("Metadata:")
-    for k, v in meta.items():
-        print(f"  {k}: {v}")
+    for k, v in tags:
+        print(f"  {k}: {list(v)}")
 
 
 def play_and_visualize(filepath):
@@ -71,8 +248,11 @@ def play_and_visualize(filepath):
         sd.check_output_settings(samplerate=sr, channels=1)
     except sd.PortAudioError:
         print(f"Warning: Sample rate {sr} not supported. Falling back to 44100 Hz.")
+        try:
+            y = resample_audio(y, sr, 44100)
+        except ImportError:
+            y, _ = load_audio(filepath, sr=44100, mono=True)
         sr = 44100
-        y, _ = load_audio(filepath, sr=sr, mono=True)
 
     if y.size == 0:
         print("Failed to load audio.")
@@ -83,36 +263,78 @@ def play_and_visualize(filepath):
     duration = len(y) / sr
     print(f"Duration: {duration:.2f} seconds\n")
 
+    # Play int16 so the device gets its native format without a per-block
+    # float conversion; the waveform is drawn from the same int16 buffer,
+    # so the float32 signal is dropped once converted
+    pcm = to_pcm16(y)
+    del y
+
+    # One fixed scale for the whole file: no per-frame max, no flicker
+    wave_width = 60
+    wave_height = 18
+    wave_peak = waveform_peak(pcm)
+
     blocksize = 1024
-    cursor = [0]
+    callback, cursor = make_pcm_callback(pcm)
+
+    # numba compiles its kernels on first call; pay that here, before the
+    # audio callback is running, rather than stalling it on the first frame
+    render_waveform_vertical(pcm[:sr // 10], width=wave_width, height=wave_height, peak=wave_peak)
 
-    def callback(outdata, frames, time_info, status):
-        idx = cursor[0]
-        chunk = y[idx:idx+frames]
-        if len(chunk) < frames:
-            outdata[:len(chunk), 0] = chunk
-            outdata[len(chunk):, 0] = 0
-            raise sd.CallbackStop()
-        outdata[:, 0] = chunk
-        cursor[0] += frames
+    done = threading.Event()
+    stream = sd.OutputStream(samplerate=sr, channels=1, dtype="int16",
+                              callback=callback, blocksize=blocksize,
+                              finished_callback=done.set)
 
-    stream = sd.OutputStream(samplerate=sr, channels=1,
-                              callback=callback, blocksize=blocksize)
+    # Frames go to the binary buffer; push pending text out first to keep order
+    sys.stdout.flush()
+    out = sys.stdout.buffer
 
+    # Absolute cursor moves to each waveform row, then the fixed status line
+    term = get_terminal()
+    row_moves = [term.move(row, 0).encode() for row in range(wave_height + 1)]
+    shown_rows = [None] * wave_height
+    shown_sec = -1
+
+    frame_period = 1.0 / FPS
     with stream:
-        while cursor[0] < len(y):
-            elapsed = cursor[0] / sr
-            end = min(cursor[0] + sr // 10, len(y))
-            chunk = y[cursor[0]:end]
-            bars = render_waveform_vertical(chunk, width=60, height=18)
-
-            # move cursor up to overwrite previous waveform
-            print("\033[H" * (18 + 2), end="")
-            for line in bars:
-                print(f"│{line}")
-            print(f"└ Elapsed: {elapsed:.2f}s / {duration:.2f}s".ljust(80))
-
-    print("\nPlayback finished.")
+        next_tick = time.time()
+        # The callback stops the stream on the final partial block without
+        # advancing cursor, so wait for the stream to report it has finished
+        while not done.is_set():
+            next_tick += frame_period
+            pos = int(cursor[0])  # one snapshot per frame
+            elapsed = pos / sr
+            # Envelope scan over int16 PCM: half the bytes of the float32 signal
+            chunk = pcm[pos:pos + sr // 10]
+            bars = render_waveform_vertical(chunk, width=wave_width, height=wave_height, peak=wave_peak)
+
+            # Only rows that differ from what is on screen are redrawn
+            buf = bytearray()
+            for row, line in enumerate(bars):
+                if line != shown_rows[row]:
+                    buf += row_moves[row]
+                    buf += ROW_PREFIX
+                    buf += line
+                    shown_rows[row] = line
+            # Status only changes once a second; skip rewriting it in between
+            sec = int(elapsed)
+            if sec != shown_sec:
+                buf += row_moves[wave_height]
+                buf += f"└ Elapsed: {sec}s / {duration:.0f}s".ljust(80).encode()
+                shown_sec = sec
+            if buf:
+                out.write(buf)
+                out.flush()
+
+            now = time.time()
+            if now > next_tick:
+                next_tick = now  # fell behind: resync rather than render a catch-up burst
+            else:
+                done.wait(next_tick - now)  # returns early once playback ends
+
+    # Park the cursor below the status line before the closing message
+    print(term.move(wave_height + 1, 0) + "Playback finished.")
 
 
 def main():
@@ -1,12 +1,18 @@
 import sys
 import time
 import argparse
+import threading
+from dataclasses import dataclass
+from typing import Optional
 import numpy as np
 import sounddevice as sd
-from mutagen import File as MutagenFile
-from blessed import Terminal
 
-from .utils import load_audio
+from .utils import load_audio, resample_audio, to_pcm16, make_pcm_callback, read_tags, get_terminal
+
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
 
 fast = False
 pretty = False
@@ -17,41 +23,118 @@ DEFAULT_COLORS = [160, 166, 3, 46, 22]
 
 def get_metadata(filepath):
     desired_keys = ["title", "artist", "album", "copyright"]
-    meta = MutagenFile(filepath, easy=True)
+    tags = dict(read_tags(filepath) or ())
     metadata = {}
-    if meta:
-        for key in desired_keys:
-            value = meta.get(key)
-            if value:
-                metadata[key] = value[0]
+    for key in desired_keys:
+        value = tags.get(key)
+        if value:
+            metadata[key] = value[0]
     return metadata
 
 
-def render_spectrum_bars(chunk, width=60, height=18, sr=44100, floor_db=-60.0, f_min=20.0, ref=1.0):
-    if len(chunk) == 0:
-        return [0] * width
+@dataclass
+class SpectrumPlan:
+    """FFT window and band layout for one (sr, hop, width), built once per file."""
+    window: np.ndarray
+    n_bins: int
+    reduceat_idx: np.ndarray
+    empty_mask: np.ndarray
+    floor_db: float
+    inv_neg_floor: float
+    scratch: np.ndarray   # width-sized float32 buffer for the in-place dB path
+    levels: np.ndarray    # width-sized int buffer returned by render_spectrum_bars
+    fft: Optional[object] = None  # planned pyfftw.FFTW over a hop-sized buffer
+
 
-    w     = np.hanning(len(chunk))
-    spec  = np.abs(np.fft.rfft(chunk * w))
-    freqs = np.fft.rfftfreq(len(chunk), 1.0 / sr)
+def make_spectrum_plan(hop, sr, width=60, floor_db=-60.0, f_min=20.0):
+    freqs = np.fft.rfftfreq(hop, 1.0 / sr)
     f_max = sr / 2
     edges = np.logspace(np.log10(f_min), np.log10(f_max), num=width + 1)
 
-    bands = []
-    for i in range(width):
-        lo, hi = edges[i], edges[i + 1]
-        idx    = np.where((freqs >= lo) & (freqs < hi))[0]
-        bands.append(spec[idx].max() if idx.size else 0.0)
-
-    mags_db = 20 * np.log10(np.array(bands) / (ref + 1e-9) + 1e-9)
-    mags_db = np.clip(mags_db, floor_db, None)
-    norm    = (mags_db - floor_db) / (-floor_db)
-    levels  = (norm * height).astype(int)
-    return levels
+    # Band i covers bins idx[i]:idx[i+1]; empty bands are zeroed after the reduce.
+    idx    = np.searchsorted(freqs, edges)
+    n_bins = int(idx[-1])
+
+    fft = None
+    if pyfftw is not None:
+        in_buf  = pyfftw.empty_aligned(hop, dtype="float32")
+        out_buf = pyfftw.empty_aligned(hop // 2 + 1, dtype="complex64")
+        fft     = pyfftw.FFTW(in_buf, out_buf, flags=("FFTW_MEASURE",), threads=1)
+
+    return SpectrumPlan(
+        window=np.hanning(hop).astype(np.float32),
+        n_bins=n_bins,
+        reduceat_idx=np.minimum(idx[:-1], max(n_bins - 1, 0)),
+        empty_mask=idx[:-1] >= idx[1:],
+        floor_db=floor_db,
+        inv_neg_floor=1.0 / -floor_db,
+        scratch=np.empty(width, dtype=np.float32),
+        levels=np.empty(width, dtype=int),
+        fft=fft,
+    )
+
+
+def windowed_spectrum(chunk, plan):
+    """Magnitude spectrum of one hop-sized chunk, zero-padded if short."""
+    hop = len(plan.window)
+    chunk = chunk.astype(np.float32, copy=False)
+    if len(chunk) < hop:
+        chunk = np.pad(chunk, (0, hop - len(chunk)))
+
+    # float32 in keeps the multiply and the FFT in single precision
+    if plan.fft is not None:
+        np.multiply(chunk, plan.window, out=plan.fft.input_array, casting="same_kind")
+        return np.abs(plan.fft())
+    return np.abs(np.fft.rfft(chunk * plan.window))
+
+
+def estimate_ref_level(y, plan, n_windows=32, seed=0):
+    """
+    Reference magnitude for the dB scale: the 90th percentile over the spectra
+    of a few randomly sampled hop-sized windows, instead of one FFT of the file.
+    """
+    hop = len(plan.window)
+    starts = np.random.default_rng(seed).integers(0, max(1, len(y) - hop), size=n_windows)
+    spectra = np.concatenate([windowed_spectrum(y[i:i + hop], plan) for i in starts])
+    return np.percentile(spectra, 90)
+
+
+def _row_color_idx(row, height):
+    """Index into the colour steps for a spectrum row, counted from the top."""
+    return (
+        4 if row >= height * 0.9 else
+        3 if row >= height * 0.7 else
+        2 if row >= height * 0.5 else
+        1 if row >= height * 0.3 else
+        0
+    )
+
+
+def render_spectrum_bars(chunk, plan, height=18, ref=1.0):
+    width = len(plan.empty_mask)
+    if len(chunk) == 0 or plan.n_bins == 0:
+        return np.zeros(width, dtype=int)
+
+    spec = windowed_spectrum(chunk, plan)
+    buf  = plan.scratch
+    np.maximum.reduceat(spec[:plan.n_bins], plan.reduceat_idx, out=buf)
+    buf[plan.empty_mask] = 0.0
+
+    # norm = (20*log10(bands/ref) - floor) / -floor, clipped at 0, all in place
+    buf *= 1.0 / (ref + 1e-9)
+    buf += 1e-9
+    np.log10(buf, out=buf)
+    buf *= 20.0 * plan.inv_neg_floor
+    buf += 1.0
+    np.maximum(buf, 0.0, out=buf)
+    buf *= height
+    # levels is reused by the next call; callers consume it before rendering again
+    np.copyto(plan.levels, buf, casting="unsafe")
+    return plan.levels
 
 
 def play_and_visualize(filepath, color_steps_override=None):
-    term = Terminal()
+    term = get_terminal()
     y, sr = load_audio(filepath, mono=True)
     if y.size == 0:
         print(term.red("Failed to load audio."))
@@ -60,86 +143,104 @@ def play_and_visualize(filepath, color_steps_override=None):
     try:
         sd.check_output_settings(samplerate=sr, channels=1)
     except sd.PortAudioError:
+        try:
+            y = resample_audio(y, sr, 44100)
+        except ImportError:
+            y, _ = load_audio(filepath, sr=44100, mono=True)
         sr = 44100
-        y, _ = load_audio(filepath, sr=sr, mono=True)
 
     # Determine color steps
     color_steps = color_steps_override if color_steps_override is not None else DEFAULT_COLORS
 
-    window        = np.hanning(len(y))
-    full_spectrum = np.abs(np.fft.rfft(y * window))
-    file_peak     = np.percentile(full_spectrum, 90)
+    hop    = sr // 10
+    spectrum_height = 18
+    spectrum_width  = 60
+    plan = make_spectrum_plan(hop, sr, width=spectrum_width)
+
+    file_peak     = estimate_ref_level(y, plan)
     duration      = len(y) / sr
     metadata      = get_metadata(filepath)
 
+    # Play int16 so the device gets its native format without a per-block
+    # float conversion; y stays contiguous float32 for the visualizer
+    y = np.ascontiguousarray(y, dtype=np.float32)
+    pcm = to_pcm16(y)
     blocksize = 1024
-    def callback(outdata, frames, time_info, status):
-        idx   = callback.idx
-        chunk = y[idx:idx + frames]
-        if len(chunk) < frames:
-            outdata[:len(chunk), 0] = chunk
-            outdata[len(chunk):, 0] = 0
-            raise sd.CallbackStop()
-        outdata[:, 0] = chunk
-        callback.idx += frames
-    callback.idx = 0
+    callback, _ = make_pcm_callback(pcm)
 
-    hop    = sr // 10
     fps    = 60 if pretty else 15 if fast else 30
     frames = int(np.ceil(duration * fps))
-    spectrum_height = 18
-    spectrum_width  = 60
 
-    with sd.OutputStream(samplerate=sr, channels=1, callback=callback, blocksize=blocksize):
+    # Pre-encoded frame pieces: glyphs picked once for --fast/--pretty,
+    # then one cursor move and one SGR prefix per row
+    cell_on   = ("█" if fast else "███" if pretty else "██").encode()
+    cell_off  = ("".ljust(2) if fast else "".ljust(3) if pretty else "".ljust(2)).encode()
+    row_blank = cell_off * spectrum_width
+    row_moves = [term.move(row, 0).encode() for row in range(spectrum_height)]
+    # blessed picks the sequence for the terminal's colour support (empty when
+    # styling is off), so it agrees with term.normal below
+    row_sgr   = [str(term.color(color_steps[_row_color_idx(row, spectrum_height)])).encode()
+                 for row in range(spectrum_height)]
+    normal    = term.normal.encode()
+    row_thresholds = (spectrum_height - np.arange(spectrum_height))[:, None]
+    elapsed_move   = term.move(spectrum_height, 0).encode()
+    metadata_block = "".join(term.move(spectrum_height + 2 + i, 0) + f"{key}: {value}"
+                             for i, (key, value) in enumerate(metadata.items())).encode()
+
+    done = threading.Event()
+    with sd.OutputStream(samplerate=sr, channels=1, dtype="int16",
+                         callback=callback, blocksize=blocksize,
+                         finished_callback=done.set):
         with term.fullscreen(), term.hidden_cursor():
-            start_time = time.time()
+            shown_rows  = [None] * spectrum_height
+            shown_sec   = -1
+            frame_count = 0
+            start_time  = time.time()
             for frame in range(frames):
+                next_tick = start_time + (frame + 1) / fps
+                if time.time() > next_tick:
+                    continue  # already behind schedule: drop this frame
                 elapsed = time.time() - start_time
                 idx = int(elapsed * sr)
-                if idx >= len(y):
+                if idx >= len(y) or done.is_set():
                     break
 
                 chunk = y[idx : idx + hop]
-                levels = render_spectrum_bars(chunk, width=spectrum_width, height=spectrum_height, sr=sr, ref=file_peak)
+                levels = render_spectrum_bars(chunk, plan, height=spectrum_height, ref=file_peak)
 
-                output_lines = []
+                # Whole (height, width) lit grid in one broadcast
+                lit   = levels[None, :] >= row_thresholds
+                cells = np.where(lit, cell_on, cell_off)
+                row_lit = lit.any(axis=1)
 
+                # Only rows that differ from what is on screen are redrawn
+                buf = bytearray()
                 for row in range(spectrum_height):
-                    line = ""
-                    for col, lvl in enumerate(levels):
-                        color_idx = (
-                            4 if row >= spectrum_height * 0.9 else
-                            3 if row >= spectrum_height * 0.7 else
-                            2 if row >= spectrum_height * 0.5 else
-                            1 if row >= spectrum_height * 0.3 else
-                            0
-                        )
-                        color_code = color_steps[color_idx]
-                        char = (
-                            "█" if spectrum_height - row <= lvl and fast else
-                            "███" if spectrum_height - row <= lvl and pretty else
-                            "██" if spectrum_height - row <= lvl else
-                            "".ljust(2) if fast else
-                            "".ljust(3) if pretty else
-                            "".ljust(2)
-                        )
-                        if char.strip():
-                            line += term.color(color_code)(char)
-                        else:
-                            line += char
-                    output_lines.append(term.move(row, 0) + line)
-
-                output_lines.append(term.move(spectrum_height, 0) +
-                                    f"└ Elapsed: {elapsed:.2f}s / {duration:.2f}s".ljust(80))
-
-                for i, (key, value) in enumerate(metadata.items()):
-                    output_lines.append(term.move(spectrum_height + 2 + i, 0) + f"{key}: {value}")
-
-                full_frame = term.move(0, 0) + "".join(output_lines)
-                sys.stdout.write(full_frame)
-                sys.stdout.flush()
-
-                time.sleep(max(0, (start_time + (frame + 1) / fps) - time.time()))
+                    # Every cell in a row shares one colour: emit its SGR once per row
+                    if row_lit[row]:
+                        line = row_sgr[row] + b"".join(cells[row].tolist()) + normal
+                    else:
+                        line = row_blank
+                    if line != shown_rows[row]:
+                        buf += row_moves[row]
+                        buf += line
+                        shown_rows[row] = line
+
+                # Status only changes once a second; skip rewriting it in between
+                sec = int(elapsed)
+                if sec != shown_sec:
+                    buf += elapsed_move
+                    buf += f"└ Elapsed: {sec}s / {duration:.0f}s".ljust(80).encode()
+                    shown_sec = sec
+                if frame_count == 0:
+                    buf += metadata_block  # static: drawn once
+                frame_count += 1
+                if buf:
+                    sys.stdout.buffer.write(buf)
+                    sys.stdout.buffer.flush()
+
+                if done.wait(max(0, next_tick - time.time())):
+                    break  # playback finished during the wait
 
     print(term.move(spectrum_height + 7, 0) + term.green("Playback finished."))
 
@@ -1,5 +1,87 @@
+import os
 import numpy as np
+import sounddevice as sd
 import subprocess
+import tempfile
+from functools import lru_cache
+from math import gcd
+from mutagen import File as MutagenFile, MutagenError
+from mutagen.easyid3 import EasyID3
+from blessed import Terminal
+
+try:
+    from scipy.signal import resample_poly
+except ImportError:
+    resample_poly = None
+
+# ANSI 256-colour foreground sequences, keyed by colour code
+_FG_SGR = {}
+
+def ansi_fg(color):
+    """
+    Return the ANSI 256-colour foreground escape sequence for a colour code.
+
+    Sequences are cached so render loops never re-format them.
+    """
+    seq = _FG_SGR.get(color)
+    if seq is None:
+        seq = _FG_SGR[color] = f"\033[38;5;{color}m"
+    return seq
+
+_TERMINAL = None
+
+def get_terminal():
+    """
+    Return the process-wide blessed Terminal, creating it on first use.
+
+    curses terminal setup only happens once per process, so repeated
+    play_and_visualize calls share one instance instead of rebuilding it.
+    """
+    global _TERMINAL
+    if _TERMINAL is None:
+        _TERMINAL = Terminal()
+    return _TERMINAL
+
+def _read_pcm_f32(cmd, n_estimate):
+    """
+    Run an ffmpeg command and read its f32le stdout straight into a float32 array.
+
+    The array is preallocated from ``n_estimate`` samples and doubled if the
+    stream turns out to be longer, so no intermediate ``bytes`` copy is made.
+    If the buffer had to grow, or more than a tenth of it went unused, the
+    samples are copied once into a right-sized array so the slack is freed.
+    stderr goes to a temporary file rather than a pipe, so a chatty decoder
+    cannot fill the pipe and stall while stdout is being read.
+    """
+    out = np.empty(max(n_estimate, 1 << 16), dtype=np.float32)
+    view = memoryview(out).cast("B")
+    offset = 0
+    grew = False
+    with tempfile.TemporaryFile() as err, \
+            subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err, bufsize=0) as proc:
+        while True:
+            if offset == len(view):
+                view.release()
+                grown = np.empty(2 * len(out), dtype=np.float32)
+                grown[:len(out)] = out
+                out = grown
+                grew = True
+                view = memoryview(out).cast("B")
+            n = proc.stdout.readinto(view[offset:])
+            if not n:
+                break
+            offset += n
+        proc.wait()
+        if proc.returncode != 0:
+            err.seek(0)
+            raise subprocess.CalledProcessError(
+                proc.returncode, cmd, stderr=err.read().decode(errors="replace")
+            )
+    view.release()
+    n = offset // 4
+    if grew or len(out) - n > len(out) // 10:
+        return out[:n].copy()
+    return out[:n]
 
 def load_audio_ffmpeg(filepath, sr=None, mono=True, dtype=np.float32):
     """
@@ -19,35 +101,42 @@ def load_audio_ffmpeg(filepath, sr=None, mono=True, dtype=np.float32):
         # Probe audio info
         probe_cmd = [
             "ffprobe", "-v", "error", "-select_streams", "a:0",
-            "-show_entries", "stream=channels,sample_rate",
-            "-of", "default=noprint_wrappers=1:nokey=1", filepath
+            "-show_entries", "stream=channels,sample_rate:format=duration",
+            "-of", "default=noprint_wrappers=1", filepath
         ]
         probe = subprocess.run(probe_cmd, capture_output=True, text=True, check=True)
-        channels, orig_sr = probe.stdout.strip().split('\n')
-        channels = int(channels)
-        orig_sr = int(orig_sr)
+        info = dict(
+            line.split("=", 1) for line in probe.stdout.strip().split('\n') if "=" in line
+        )
+        channels = int(info["channels"])
+        orig_sr = int(info["sample_rate"])
+        try:
+            duration = float(info.get("duration", ""))
+        except ValueError:
+            duration = 0.0
 
         target_sr = sr if sr is not None else orig_sr
         target_channels = 1 if mono else channels
 
         ffmpeg_cmd = [
-            "ffmpeg", "-i", filepath, "-f", "f32le",
+            "ffmpeg", "-v", "error", "-i", filepath, "-f", "f32le",
             "-acodec", "pcm_f32le",
             "-ar", str(target_sr),
             "-ac", str(target_channels),
             "-"
         ]
-        proc = subprocess.run(ffmpeg_cmd, capture_output=True, check=True)
-        audio = np.frombuffer(proc.stdout, dtype=np.float32)
+        # Size the buffer from the probed duration, with a second of slack
+        n_estimate = int((duration + 1.0) * target_sr) * target_channels
+        audio = _read_pcm_f32(ffmpeg_cmd, n_estimate)
+        audio = audio[:len(audio) - len(audio) % target_channels]
 
         if mono:
             y = audio
         else:
             y = audio.reshape(-1, target_channels)
 
-        if dtype != np.float32:
-            y = y.astype(dtype)
-        return y, target_sr
+        # Contiguous, single dtype: playback and rendering copy it in bulk
+        return np.ascontiguousarray(y, dtype=dtype), target_sr
     except FileNotFoundError as e:
         # Fallback: try to load raw PCM WAV files (very limited)
         try:
@@ -61,15 +150,21 @@ def load_audio_ffmpeg(filepath, sr=None, mono=True, dtype=np.float32):
                 bits_per_sample = int.from_bytes(header[34:36], "little")
                 if bits_per_sample != 16:
                     raise RuntimeError("Only 16-bit PCM WAV supported in fallback.")
-                raw = f.read()
-                audio = np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+                # Map the sample data rather than reading it into a bytes copy;
+                # pages fault in under kernel readahead as the cast walks them
+                n_samples = (os.fstat(f.fileno()).st_size - 44) // 2
+                if n_samples > 0:
+                    pcm = np.memmap(f, dtype=np.int16, mode="r", offset=44, shape=(n_samples,))
+                else:
+                    pcm = np.empty(0, dtype=np.int16)
+                # Cast and scale in one pass straight into the float32 output
+                audio = np.multiply(pcm, np.float32(1.0 / 32768.0), dtype=np.float32)
                 if channels > 1:
                     audio = audio.reshape(-1, channels)
                 if mono and channels > 1:
-                    audio = np.mean(audio, axis=1)
-                if dtype != np.float32:
-                    audio = audio.astype(dtype)
-                return audio, orig_sr
+                    audio = audio.sum(axis=1)
+                    audio *= np.float32(1.0 / channels)
+                return np.ascontiguousarray(audio, dtype=dtype), orig_sr
         except Exception as fallback_e:
             raise RuntimeError(
                 "ffmpeg/ffprobe not found and fallback WAV loader failed: " + str(fallback_e)
@@ -101,3 +196,99 @@ def load_audio(filepath, sr=None, mono=True, dtype=np.float32):
         print("Falling back to dummy loader (returns empty array).")
         return np.array([], dtype=dtype), 0
 
+def resample_audio(y, orig_sr, target_sr):
+    """
+    Resample an already-loaded signal with polyphase filtering.
+
+    Args:
+        y (np.ndarray): Audio time series.
+        orig_sr (int): Sampling rate of y.
+        target_sr (int): Desired sampling rate.
+
+    Returns:
+        y (np.ndarray): Resampled float32 audio time series.
+
+    Raises:
+        ImportError: If scipy is not installed.
+    """
+    if resample_poly is None:
+        raise ImportError("scipy is required for in-process resampling")
+    if y.size == 0 or orig_sr <= 0 or orig_sr == target_sr:
+        return y
+    g = gcd(target_sr, orig_sr)
+    return resample_poly(y, target_sr // g, orig_sr // g).astype(np.float32, copy=False)
+
+def to_pcm16(y):
+    """
+    Convert float audio in [-1, 1] to int16 PCM, clipping out-of-range samples.
+
+    Args:
+        y (np.ndarray): Float audio time series.
+
+    Returns:
+        pcm (np.ndarray): int16 copy of y scaled by 32767.
+    """
+    scaled = np.multiply(y, np.float32(32767.0), dtype=np.float32)
+    np.clip(scaled, -32768, 32767, out=scaled)
+    return scaled.astype(np.int16)
+
+def make_pcm_callback(pcm):
+    """
+    Build an OutputStream callback that plays a mono int16 buffer once.
+
+    Args:
+        pcm (np.ndarray): Contiguous int16 samples, as returned by to_pcm16.
+
+    Returns:
+        callback (callable): sounddevice stream callback; raises CallbackStop
+            after writing the final, zero-padded block.
+        cursor (np.ndarray): One-element int64 array holding the playback
+            position in samples; written only by the callback.
+    """
+    cursor = np.zeros(1, dtype=np.int64)
+    n_samples = len(pcm)
+
+    def callback(outdata, frames, time_info, status):
+        idx = cursor[0]
+        end = idx + frames
+        # Every block but the last is a full copy: one compare, no len()
+        if end <= n_samples:
+            # casting="no": a dtype mismatch fails loudly instead of converting per block
+            np.copyto(outdata[:, 0], pcm[idx:end], casting="no")
+            cursor[0] = end
+            return
+        # final block: one memset, then one contiguous copy
+        outdata.fill(0)
+        np.copyto(outdata[:n_samples - idx, 0], pcm[idx:], casting="no")
+        raise sd.CallbackStop()
+
+    return callback, cursor
+
+@lru_cache(maxsize=32)
+def _read_tags_cached(filepath, mtime):
+    meta = None
+    if filepath.lower().endswith(".mp3"):
+        # Tag-only reader: parses the ID3v2 header block and skips the MPEG
+        # stream scan MutagenFile does to fill in stream info
+        try:
+            meta = EasyID3(filepath)
+        except MutagenError:
+            meta = None
+    if meta is None:
+        meta = MutagenFile(filepath, easy=True)
+    if meta is None:
+        return None
+    return tuple((key, tuple(value)) for key, value in meta.items())
+
+def read_tags(filepath):
+    """
+    Read a file's easy-mode tags, cached per (path, modification time).
+
+    Args:
+        filepath (str): Path to the audio file.
+
+    Returns:
+        tags (tuple or None): ``(key, values)`` pairs with ``values`` a tuple of
+        strings, or None if mutagen does not recognise the file.
+    """
+    return _read_tags_cached(filepath, os.path.getmtime(filepath))
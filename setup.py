@@ -1,4 +1,25 @@
-from setuptools import setup, find_packages
+import os
+from setuptools import setup, find_packages, Extension
+
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    cythonize = None
+
+# The compiled render kernel is optional; play_peak falls back without it.
+# Without Cython, build from the generated C shipped in the sdist, if present;
+# optional=True turns a failed compile into a warning instead of an abort.
+ext_modules = []
+if cythonize is not None:
+    ext_modules = cythonize(
+        [Extension("nowplay._render", ["nowplay/_render.pyx"])],
+        language_level=3,
+    )
+    # cythonize does not carry optional through to the extensions it returns
+    for ext in ext_modules:
+        ext.optional = True
+elif os.path.exists(os.path.join("nowplay", "_render.c")):
+    ext_modules = [Extension("nowplay._render", ["nowplay/_render.c"], optional=True)]
 
 setup(
     name="nowplay",
@@ -7,13 +28,16 @@ setup(
     author="PJ H.",
     author_email="archood2@gmail.com",
     packages=find_packages(),
+    ext_modules=ext_modules,
     install_requires=[
         "numpy",
         "sounddevice",
-        "matplotlib",
         "mutagen",
         "blessed",
     ],
+    extras_require={
+        "fast": ["pyfftw", "numba", "scipy"],
+    },
     entry_points={
         "console_scripts": [
             "nowplay-peak=nowplay.play_peak:main",